@@ -1,11 +1,23 @@
-from glob import glob
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from functools import lru_cache
 
-from platform import system
+from platform import machine, system
 from setuptools import setup, Extension
 from setuptools.command.build_ext import build_ext
+from setuptools.errors import CompileError, LinkError
+
+try:
+    from setuptools.modified import newer_group
+except ImportError:  # setuptools < 69
+    from distutils.dep_util import newer_group
 import argparse
+import hashlib
 import os
+import shutil
 import sys
+import tempfile
 
 SCS_ARG_MARK = "--scs"  # used to pass custom arguments to setup
 
@@ -24,6 +36,17 @@ parser.add_argument(
     default=False,
     help="Also compile the GPU CUDA version of SCS",
 )
+parser.add_argument(
+    "--cuda-static",
+    dest="cuda_static",
+    action="store_true",
+    default=os.environ.get("SCS_CUDA_STATIC", "0") == "1",
+    help=(
+        "Link the GPU version of SCS against the static CUDA runtime, "
+        "cuBLAS and cuSPARSE libraries (also set by SCS_CUDA_STATIC=1). "
+        "Linux only."
+    ),
+)
 parser.add_argument(
     "--mkl",
     dest="mkl",
@@ -33,6 +56,22 @@ parser.add_argument(
     "to succeed. This option will be removed soon after which we shall "
     "install the MKL version by default if MKL is available.",
 )
+parser.add_argument(
+    "--mkl-threading",
+    dest="mkl_threading",
+    choices=["sequential", "intel", "gnu", "tbb"],
+    default=None,
+    help=(
+        "MKL threading layer to link with --mkl, instead of whatever the "
+        "MKL found provides (often mkl_rt, which loads Intel OpenMP and "
+        "clashes with the GNU OpenMP runtime SCS itself uses). "
+        "sequential: mkl_sequential; intel: mkl_intel_thread + iomp5; "
+        "gnu: mkl_gnu_thread + gomp; tbb: mkl_tbb_thread + tbb. "
+        "Defaults to gnu when SCS uses the GNU OpenMP runtime (gcc on "
+        "Linux), sequential for other OpenMP runtimes and intel without "
+        "OpenMP. Only used on Linux and macOS."
+    ),
+)
 parser.add_argument(
     "--cudss",
     dest="cudss",
@@ -44,17 +83,44 @@ parser.add_argument(
     "--openmp",
     dest="openmp",
     action="store_true",
-    default=False,
-    help="Compile with OpenMP parallelization enabled. This can make SCS"
-    "faster, but requires a compiler with openMP support, the user "
-    "must control how many threads OpenMP uses.",
+    default=True,
+    help="Compile with OpenMP parallelization enabled if the compiler "
+    "supports it (the default). This can make SCS faster, the user "
+    "must control how many threads OpenMP uses, e.g. OMP_NUM_THREADS=1 "
+    "disables the parallelization at runtime.",
+)
+parser.add_argument(
+    "--no-openmp",
+    dest="openmp",
+    action="store_false",
+    help="Compile without OpenMP parallelization.",
+)
+parser.add_argument(
+    "--no-lto",
+    dest="lto",
+    action="store_false",
+    default=True,
+    help="Disable link time optimization, which is used if the compiler "
+    "supports it.",
+)
+parser.add_argument(
+    "--pgo",
+    dest="pgo",
+    choices=["generate", "use"],
+    default=None,
+    help=(
+        "Profile guided optimization: build an instrumented SCS with "
+        "generate, run scripts/pgo_train.py, then rebuild with use. The "
+        "profiles are kept in SCS_PGO_DIR (default build/pgo)."
+    ),
 )
 parser.add_argument(
     "--float",
     dest="float32",
     action="store_true",
     default=False,
-    help="Use 32 bit (single precision) floats, default is 64 bit",
+    help="Use 32 bit (single precision) floats only, by default 64 bit "
+    "solvers are built along with 32 bit ones (float32 setting)",
 )
 parser.add_argument(
     "--extraverbose",
@@ -87,8 +153,44 @@ parser.add_argument(
     default=False,
     help="Use 64 bit ints for the blas/lapack libs",
 )
+parser.add_argument(
+    "--march",
+    dest="march",
+    default=None,
+    help=(
+        "Target instruction set passed to -march (e.g. x86-64-v3 for "
+        "AVX2+FMA wheels that still run on most CPUs from the last decade, "
+        "or native). Defaults to the compiler baseline so that binaries stay "
+        "portable, set SCS_NATIVE=1 to build for the host CPU."
+    ),
+)
+parser.add_argument(
+    "--fast-math",
+    dest="fast_math",
+    action="store_true",
+    default=False,
+    help=(
+        "Compile with -ffast-math (/fp:fast on MSVC). This is unsafe in "
+        "general since SCS relies on NaN / Inf checks to detect failures."
+    ),
+)
+parser.add_argument(
+    "--isa-variants",
+    dest="isa_variants",
+    action="store_true",
+    default=False,
+    help=(
+        "Also compile x86-64-v3 (AVX2, FMA) and x86-64-v4 (AVX-512) builds "
+        "of the CPU solvers, the fastest one supported by the CPU is picked "
+        "at import time. Needs gcc or clang, and cannot be combined with "
+        "--march native"
+    ),
+)
 args, unknown = parser.parse_known_args()
 
+if args.march is None and os.environ.get("SCS_NATIVE", "0") == "1":
+    args.march = "native"
+
 env_lib_dirs = os.environ.get("BLAS_LAPACK_LIB_PATHS", [])
 env_libs = os.environ.get("BLAS_LAPACK_LIBS", [])
 
@@ -100,18 +202,90 @@ if SCS_ARG_MARK in sys.argv:
 
 import subprocess
 
+@lru_cache(maxsize=None)
+def pkgconfig_output(package):
+    return subprocess.getstatusoutput(
+        'pkg-config --cflags --libs {}'.format(package))
+
+
 # From: https://stackoverflow.com/questions/60174152/how-do-i-add-pkg-config-the-setup-py-of-a-cython-wrapper
 def pkgconfig(package, kw):
     flag_map = {'-I': 'include_dirs', '-L': 'library_dirs', '-l': 'libraries'}
-    retcode, output = subprocess.getstatusoutput(
-        'pkg-config --cflags --libs {}'.format(package))
+    retcode, output = pkgconfig_output(package)
     if retcode != 0:
         raise Exception(
             f'Invocation of pkg-config for package {package} failed!', output)
     for token in output.strip().split():
-        kw.setdefault(flag_map.get(token[:2]), []).append(token[2:])
+        if token[:2] in flag_map:
+            kw.setdefault(flag_map[token[:2]], []).append(token[2:])
+        elif token[:2] == "-D":
+            name, _, value = token[2:].partition("=")
+            kw.setdefault("define_macros", []).append((name, value or None))
+        else:  # e.g. -pthread or -m64, needed when compiling and linking
+            kw.setdefault("extra_compile_args", []).append(token)
+            kw.setdefault("extra_link_args", []).append(token)
     return kw
 
+
+# BLAS / LAPACK vendors tried in order, override with comma separated lists
+# in the SCS_BLAS_ORDER / SCS_LAPACK_ORDER environment variables. Names not
+# listed in PKGCONFIG_NAMES are passed to pkg-config as they are.
+DEFAULT_BLAS_ORDER = "mkl,openblas,blis,accelerate,atlas,blas"
+DEFAULT_LAPACK_ORDER = "mkl,openblas,accelerate,atlas,lapack"
+
+# pkg-config packages to try for each vendor, for 32 and 64 bit blas ints:
+PKGCONFIG_NAMES = {
+    "mkl": ["mkl-sdl", "mkl-dynamic-lp64-iomp"],
+    "openblas": ["openblas"],
+}
+PKGCONFIG_NAMES_64 = {
+    "mkl": ["mkl-dynamic-ilp64-iomp", "mkl-dynamic-ilp64-seq"],
+    "openblas": ["openblas64_", "openblas64"],
+    "blas": ["blas64"],
+    "lapack": ["lapack64"],
+}
+# Vendors without an ILP64 build, skipped with --blas64:
+LP64_ONLY_VENDORS = {"accelerate", "blis", "atlas"}
+
+
+def find_library(order):
+    """Build info for the first vendor in `order` that is found."""
+    names = PKGCONFIG_NAMES_64 if args.blas64 else PKGCONFIG_NAMES
+    for vendor in order.split(","):
+        vendor = vendor.strip().lower()
+        if args.blas64 and vendor in LP64_ONLY_VENDORS:
+            print(f"Skipping {vendor}, it has no 64 bit int (ILP64) build")
+            continue
+        if vendor == "accelerate":
+            if system() == "Darwin":
+                print("Found Accelerate")
+                return {
+                    "extra_link_args": ["-Wl,-framework", "-Wl,Accelerate"]
+                }
+            continue
+        for package in names.get(vendor, [vendor]):
+            try:
+                info = pkgconfig(package, {})
+            except Exception:
+                continue
+            print(f"Found {vendor} (pkg-config package {package})")
+            return info
+    return {}
+
+
+def library_not_found(kind, order):
+    """Error for when no vendor in `order` provides `kind` (blas / lapack)."""
+    int_size = "64 bit int (ILP64) " if args.blas64 else ""
+    return ValueError(
+        f"No {int_size}{kind} library found, tried: {order}. Install one of "
+        f"these, set SCS_{kind.upper()}_ORDER, or give the libraries with "
+        "BLAS_LAPACK_LIBS and BLAS_LAPACK_LIB_PATHS."
+    )
+
+
+# Cached so that the libraries are only looked up (and printed) once, callers
+# must not modify the returned dicts.
+@lru_cache(maxsize=1)
 def get_infos():
 
     if env_lib_dirs or env_libs:
@@ -123,34 +297,114 @@ def get_infos():
             env_vars["libraries"] = env_libs.split(":")
         return env_vars, {}
 
-    try:
-        import numpy
-        from numpy.distutils.system_info import get_info
-
-    except ImportError: # Py >= 3.12
-        blas_info = pkgconfig('blas', {})
-        lapack_info = pkgconfig('lapack', {})
-        return blas_info, lapack_info
-
-    # Print out full BLAS / LAPACK info
-    numpy.show_config()
-
-    # environment variables not set, using defaults instead
-    blas_info = get_info("blas_opt")
+    blas_order = os.environ.get("SCS_BLAS_ORDER", DEFAULT_BLAS_ORDER)
+    blas_info = find_library(blas_order)
     if not blas_info:
-        blas_info = get_info("blas")
+        raise library_not_found("blas", blas_order)
     print("Blas info:")
     print(blas_info)
 
-    lapack_info = get_info("lapack_opt")
+    lapack_order = os.environ.get("SCS_LAPACK_ORDER", DEFAULT_LAPACK_ORDER)
+    lapack_info = find_library(lapack_order)
     if not lapack_info:
-        lapack_info = get_info("lapack")
+        raise library_not_found("lapack", lapack_order)
     print("Lapack info:")
     print(lapack_info)
 
     return blas_info, lapack_info
 
 
+# Threading layer and matching runtime libraries for --mkl-threading:
+MKL_THREADING_LIBS = {
+    "sequential": ("mkl_sequential", []),
+    "intel": ("mkl_intel_thread", ["iomp5"]),
+    "gnu": ("mkl_gnu_thread", ["gomp"]),
+    "tbb": ("mkl_tbb_thread", ["tbb", "stdc++"]),
+}
+
+
+def mkl_libraries(threading):
+    """MKL libraries to link, layer by layer, for the threading layer."""
+    layer, runtime = MKL_THREADING_LIBS[threading]
+    interface = "mkl_intel_ilp64" if args.blas64 else "mkl_intel_lp64"
+    return (
+        [interface, layer, "mkl_core"]
+        + runtime
+        + ["pthread", "m", "dl"]
+    )
+
+
+def is_mkl_library(library):
+    return library.startswith("mkl") or library in ("iomp5", "gomp", "tbb")
+
+
+def cuda_paths():
+    """Include and library dirs of the CUDA toolkit."""
+    if system() == "Windows":
+        cuda_path = os.environ["CUDA_PATH"]
+        return [cuda_path + "/include"], [cuda_path + "/lib/x64"]
+    return (
+        ["/usr/local/cuda/include"],
+        ["/usr/local/cuda/lib", "/usr/local/cuda/lib64"],
+    )
+
+
+def find_cudss(cuda_include_dirs):
+    """Build info for cuDSS, from pkg-config or else from CUDSS_PATH or
+    CUDSS_INCLUDE_DIR / CUDSS_LIB_DIR (defaulting to the Debian layout)."""
+    try:
+        info = pkgconfig("cudss", {})
+    except Exception:
+        if "CUDSS_PATH" in os.environ:
+            root = os.environ["CUDSS_PATH"]
+            include_dirs = [os.path.join(root, "include")]
+            library_dirs = [
+                os.path.join(root, "lib"),
+                os.path.join(root, "lib64"),
+            ]
+        else:
+            include_dirs = [
+                os.environ.get("CUDSS_INCLUDE_DIR", "/usr/include/libcudss/12")
+            ]
+            library_dirs = [
+                os.environ.get(
+                    "CUDSS_LIB_DIR", "/usr/lib/x86_64-linux-gnu/libcudss/12"
+                )
+            ]
+        info = {"include_dirs": include_dirs, "library_dirs": library_dirs}
+
+    # pkg-config leaves out the system include dirs:
+    dirs = (
+        info.get("include_dirs", [])
+        + cuda_include_dirs
+        + ["/usr/include", "/usr/local/include"]
+    )
+    if not any(os.path.isfile(os.path.join(d, "cudss.h")) for d in dirs):
+        raise ValueError(
+            "cudss.h not found so cannot install the cuDSS version of SCS. "
+            "Please install cuDSS and retry. If it is installed in a "
+            "non-standard location set CUDSS_PATH, or CUDSS_INCLUDE_DIR and "
+            "CUDSS_LIB_DIR."
+        )
+    if "cudss" not in info.setdefault("libraries", []):
+        info["libraries"] += ["cudss"]
+    return info
+
+
+# Static CUDA libraries for --cuda-static, dependents before dependencies:
+CUDA_STATIC_LIBS = [
+    "cusparse_static",
+    "cublas_static",
+    "cublasLt_static",
+    "culibos",
+    "cudart_static",
+    "stdc++",
+    "pthread",
+    "dl",
+    "rt",
+]
+
+
 def set_builtin(name, value):
     if isinstance(__builtins__, dict):
         __builtins__[name] = value
@@ -158,16 +412,150 @@ def set_builtin(name, value):
         setattr(__builtins__, name, value)
 
 
+# MSVC only knows a handful of instruction sets, map the -march levels we
+# document onto the closest /arch value. It has no equivalent of native, so
+# that one gets the default baseline:
+MSVC_ARCH = {
+    "x86-64-v3": "AVX2",
+    "x86-64-v4": "AVX512",
+}
+
+
+def get_pgo_args(compiler_type):
+    """Compile and link flags for the --pgo stage."""
+    if compiler_type == "msvc":
+        if args.pgo == "generate":
+            return ["/GL"], ["/LTCG", "/GENPROFILE"]
+        return ["/GL"], ["/LTCG", "/USEPROFILE"]
+    pgo_dir = os.path.abspath(os.environ.get("SCS_PGO_DIR", "build/pgo"))
+    # -fprofile-correction: the OpenMP loops update the counters racily
+    flags = [f"-fprofile-{args.pgo}={pgo_dir}", "-fprofile-correction"]
+    return flags, flags
+
+
+# Instruction set specific builds of the CPU solvers, see --isa-variants.
+# The module name suffixes must match the ones tried in scs/py/__init__.py.
+ISA_VARIANTS = {
+    "_x86_64_v3": "x86-64-v3",
+    "_x86_64_v4": "x86-64-v4",
+}
+
+
+def get_optimization_args(compiler_type, march):
+    if compiler_type == "msvc":
+        compile_args = ["/O2"]
+        if march in MSVC_ARCH:
+            compile_args += ["/arch:" + MSVC_ARCH[march]]
+        if args.fast_math:
+            compile_args += ["/fp:fast"]
+        return compile_args
+
+    # Only the module init function needs to be exported, hiding the rest
+    # also lets the linker drop unused SCS internals.
+    compile_args = ["-O3", "-funroll-loops", "-fvisibility=hidden"]
+    # The parts of -ffast-math that keep the NaN / Inf semantics SCS relies
+    # on, e.g. sqrt can be inlined when it need not set errno.
+    compile_args += [
+        "-fno-math-errno",
+        "-fno-trapping-math",
+        "-fno-signed-zeros",
+    ]
+    if march:
+        compile_args += ["-march=" + march]
+        # -mtune takes CPU names, not ISA levels such as x86-64-v3
+        if march == "native":
+            compile_args += ["-mtune=native"]
+    if args.fast_math:
+        compile_args += ["-ffast-math"]
+    return compile_args
+
+
+# Macros that only select the linear system solver or the Python module. Of
+# the sources shared between the extensions only scs.c reads one of them
+# (INDIRECT), so the others compile to the same object for every extension.
+SOLVER_MACROS = {
+    "PY_INDIRECT",
+    "PY_GPU",
+    "PY_MKL",
+    "PY_CUDSS",
+    "SCS_PY_MODULE",
+    "INDIRECT",
+    "GPU_TRANSPOSE_MAT",
+}
+
+OPENMP_TEST_CODE = """
+#include <omp.h>
+int main(void) {
+  int n = 0;
+#pragma omp parallel reduction(+ : n)
+  n += omp_get_thread_num() >= 0;
+  return n > 0 ? 0 : 1;
+}
+"""
+
+# Compiles only with gcc, whose -fopenmp links the GNU OpenMP runtime:
+GCC_TEST_CODE = """
+#if !defined(__GNUC__) || defined(__clang__) || defined(__INTEL_COMPILER)
+#error not gcc
+#endif
+int main(void) { return 0; }
+"""
+
+CLANG_TEST_CODE = """
+#ifndef __clang__
+#error not clang
+#endif
+int main(void) { return 0; }
+"""
+
+EMPTY_TEST_CODE = """
+int main(void) { return 0; }
+"""
+
+
+def compiler_supports(compiler, code, compile_args=(), link_args=()):
+    """Whether `code` compiles and links with the given extra flags."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        src = os.path.join(tmpdir, "test.c")
+        with open(src, "w") as f:
+            f.write(code)
+        # Failing probes are expected, keep their errors out of the log:
+        sys.stderr.flush()
+        stderr = os.dup(2)
+        try:
+            null = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(null, 2)
+            os.close(null)
+            objects = compiler.compile(
+                [src], output_dir=tmpdir, extra_postargs=list(compile_args)
+            )
+            compiler.link_executable(
+                objects,
+                "test",
+                output_dir=tmpdir,
+                extra_postargs=list(link_args),
+            )
+        except (CompileError, LinkError):
+            return False
+        finally:
+            os.dup2(stderr, 2)
+            os.close(stderr)
+    return True
+
+
 class build_ext_scs(build_ext):
     def finalize_options(self):
         build_ext.finalize_options(self)
+        if self.parallel is None:  # build in parallel unless told otherwise
+            self.parallel = os.cpu_count() or 1
         # Prevent numpy from thinking it is still in its setup process:
         set_builtin("__NUMPY_SETUP__", False)
         import numpy
 
         self.copy = {"include_dirs": [numpy.get_include()]}
+        self.link_mkl_threading = False
 
-        blas_info, lapack_info = get_infos()
+        blas_info, lapack_info = deepcopy(get_infos())
 
         if blas_info or lapack_info:
             self.copy["define_macros"] = (
@@ -191,30 +579,293 @@ class build_ext_scs(build_ext):
                 "extra_compile_args", []
             ) + lapack_info.pop("extra_compile_args", [])
 
-    def build_extension(self, ext):
+            if args.blas64:
+                self.use_blas64()
+            # mkl_rt defaults to the 32 bit int interface, so for --blas64
+            # the layered MKL libraries are needed as well:
+            uses_mkl = any(map(is_mkl_library, self.copy["libraries"]))
+            # Linked in build_extensions, once the OpenMP runtime is known:
+            self.link_mkl_threading = system() != "Windows" and (
+                args.mkl or (args.blas64 and uses_mkl)
+            )
+
+    def use_blas64(self):
+        """Link the 64 bit int (ILP64) variants of the blas/lapack libs."""
+        libraries = []
+        for lib in self.copy["libraries"]:
+            if lib == "openblas":
+                lib = "openblas64_"
+            elif lib.startswith("mkl_intel_lp64"):
+                lib = lib.replace("lp64", "ilp64")
+            libraries.append(lib)
+        self.copy["libraries"] = libraries
+        if "openblas64_" in libraries:
+            # this build suffixes its symbols, e.g. dgemm_64_
+            self.copy["define_macros"] += [("BLASSUFFIX", "_64_")]
+        if any(map(is_mkl_library, libraries)):
+            self.copy["define_macros"] += [("MKL_ILP64", None)]
+
+    def get_mkl_threading(self, openmp_args):
+        """MKL threading layer matching the OpenMP runtime SCS links."""
+        if args.mkl_threading:
+            threading = args.mkl_threading
+        elif not openmp_args:
+            threading = "intel"
+        elif system() == "Linux" and compiler_supports(
+            self.compiler, GCC_TEST_CODE, openmp_args
+        ):
+            threading = "gnu"
+        else:
+            # MKL has no threading layer for other runtimes (e.g. LLVM's
+            # libomp), linking one would load a second OpenMP runtime:
+            threading = "sequential"
+        if threading == "gnu" and system() == "Darwin":
+            raise ValueError(
+                "MKL has no GNU threading layer on macOS, pass another "
+                "--mkl-threading."
+            )
+        return threading
+
+    def use_mkl_threading(self, threading):
+        """Replace the MKL libraries found by the `threading` ones."""
+        self.copy["libraries"] = [
+            lib for lib in self.copy["libraries"] if not is_mkl_library(lib)
+        ]
+        libraries = mkl_libraries(threading)
+        print("Linking MKL libraries:", libraries)
+        if system() == "Linux":
+            # The linker must not drop the threading layer, which only gets
+            # used through mkl_core. Libraries come before the extra link
+            # args on the command line, so pass them after this flag:
+            self.copy["extra_link_args"] += ["-Wl,--no-as-needed"] + [
+                "-l" + lib for lib in libraries
+            ]
+        else:
+            self.copy["libraries"] += libraries
+
+    def get_openmp_args(self):
+        if self.compiler.compiler_type == "msvc":
+            candidates = [(["/openmp"], [])]
+        else:
+            candidates = [(["-fopenmp"], ["-fopenmp"])]
+            if system() == "Darwin":  # Apple clang needs a separate libomp
+                candidates += [(["-Xpreprocessor", "-fopenmp"], ["-lomp"])]
+        for compile_args, link_args in candidates:
+            if compiler_supports(
+                self.compiler, OPENMP_TEST_CODE, compile_args, link_args
+            ):
+                return compile_args, link_args
+        print("OpenMP not supported by the compiler, building without it")
+        return [], []
+
+    def get_lto_args(self):
+        if self.compiler.compiler_type == "msvc":
+            return ["/GL"], ["/LTCG"]
+        if compiler_supports(self.compiler, CLANG_TEST_CODE):
+            candidates = [(["-flto=thin"], ["-flto=thin"])]
+        else:
+            candidates = [
+                (["-flto=auto", "-fno-fat-lto-objects"], ["-flto=auto"])
+            ]
+        candidates += [(["-flto"], ["-flto"])]  # older compilers
+        for compile_args, link_args in candidates:
+            if compiler_supports(
+                self.compiler, EMPTY_TEST_CODE, compile_args, link_args
+            ):
+                return compile_args, link_args
+        print("LTO not supported by the compiler, building without it")
+        return [], []
+
+    def use_compiler_cache(self):
+        """Prefix the compile commands with ccache / sccache if available."""
+        launcher = shutil.which("ccache") or shutil.which("sccache")
+        if not launcher or self.compiler.compiler_type == "msvc":
+            return
+        for attr in ("compiler", "compiler_so", "compiler_cxx"):
+            command = getattr(self.compiler, attr, None)
+            if not command:
+                continue
+            if os.path.basename(command[0]) in ("ccache", "sccache"):
+                continue  # already set up by the user, e.g. via CC
+            setattr(self.compiler, attr, [launcher] + command)
+
+    def compile(self, sources, **kwargs):
+        """Like self.compiler.compile, with one thread per source file."""
+        workers = os.cpu_count() if self.parallel is True else self.parallel
+        if not workers or workers < 2 or len(sources) < 2:
+            return self.compiler.compile(sources, **kwargs)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                lambda src: self.compiler.compile([src], **kwargs), sources
+            )
+            return [obj for objects in results for obj in objects]
+
+    def build_extensions(self):
+        if args.isa_variants and self.compiler.compiler_type == "msvc":
+            # isa_level() in scs/scsmodule.h uses the GCC CPU builtins, so
+            # the variants could never be picked
+            raise ValueError("--isa-variants is not supported with MSVC.")
+        self.use_compiler_cache()
+
+        # Flags that depend on the compiler, so only known at this point:
+        self.extra_compile_args = []
+        self.extra_link_args = []
+        self.pgo_compile_args = []
+        compile_args, link_args = [], []
+        if args.openmp:
+            compile_args, link_args = self.get_openmp_args()
+        if self.link_mkl_threading:
+            self.use_mkl_threading(self.get_mkl_threading(compile_args))
+        self.extra_compile_args += compile_args
+        self.extra_link_args += link_args
+        if args.lto:
+            compile_args, link_args = self.get_lto_args()
+            self.extra_compile_args += compile_args
+            self.extra_link_args += link_args
+        if args.pgo:
+            compile_args, link_args = get_pgo_args(self.compiler.compiler_type)
+            self.pgo_compile_args = compile_args
+            self.extra_compile_args += compile_args
+            self.extra_link_args += link_args
+
+        for ext in self.extensions:
+            self.prepare_extension(ext)
+        self.build_shared_objects()
+
+        build_ext.build_extensions(self)
+
+    def prepare_extension(self, ext):
         for k, v in self.copy.items():
             if not getattr(ext, k, None):
                 setattr(ext, k, [])
             getattr(ext, k).extend(v)
 
-        return build_ext.build_extension(self, ext)
+        ext.extra_compile_args += self.extra_compile_args
+        ext.extra_link_args += self.extra_link_args
+
+        march = args.march
+        for suffix, isa in ISA_VARIANTS.items():
+            if ext.name.endswith(suffix):
+                march = isa
+        ext.extra_compile_args += get_optimization_args(
+            self.compiler.compiler_type, march
+        )
+
+    def build_shared_objects(self):
+        """Compile the sources common to several extensions only once."""
+        counts = Counter(
+            src for ext in self.extensions for src in set(ext.sources)
+        )
+        shared = {src for src, count in counts.items() if count > 1}
+        solver_macros_used = {}
+        for src in shared:
+            if os.path.dirname(src) == "scs":
+                # The Python wrapper reads the solver macros through its
+                # headers, this also gives each module its own wrapper object
+                # (the extensions are built in parallel).
+                solver_macros_used[src] = set(SOLVER_MACROS)
+                continue
+            with open(src) as f:
+                text = f.read()
+            solver_macros_used[src] = {m for m in SOLVER_MACROS if m in text}
+
+        objects = {}  # (source, macros, compile args) -> object file
+        for ext in self.extensions:
+            keys = {}
+            for src in ext.sources:
+                if src in shared:
+                    macros = tuple(
+                        m
+                        for m in ext.define_macros
+                        if m[0] not in SOLVER_MACROS
+                        or m[0] in solver_macros_used[src]
+                    )
+                    keys[src] = (src, macros, tuple(ext.extra_compile_args))
+
+            # Compile what no previous extension built with the same flags:
+            todo = {}
+            for src, key in keys.items():
+                if key not in objects:
+                    todo.setdefault(key[1], []).append(src)
+            # The profiles are looked up by object path, so the directory
+            # must not change between --pgo generate and --pgo use:
+            tag_args = [
+                arg
+                for arg in ext.extra_compile_args
+                if arg not in self.pgo_compile_args
+            ]
+            for macros, sources in todo.items():
+                tag = hashlib.sha1(
+                    repr((macros, tag_args)).encode()
+                ).hexdigest()[:10]
+                output_dir = os.path.join(self.build_temp, "shared", tag)
+                ext_objects = self.compiler.object_filenames(
+                    sources, output_dir=output_dir
+                )
+                # Like build_ext, only recompile what is out of date:
+                stale = [
+                    src
+                    for src, obj in zip(sources, ext_objects)
+                    if self.force or newer_group([src] + ext.depends, obj)
+                ]
+                if stale:
+                    self.compile(
+                        stale,
+                        output_dir=output_dir,
+                        macros=list(macros),
+                        include_dirs=ext.include_dirs,
+                        debug=self.debug,
+                        extra_postargs=ext.extra_compile_args,
+                        depends=ext.depends,
+                    )
+                for src, obj in zip(sources, ext_objects):
+                    objects[keys[src]] = obj
+
+            ext.sources = [src for src in ext.sources if src not in keys]
+            ext.extra_objects = [
+                objects[k] for k in keys.values()
+            ] + ext.extra_objects
+            # relink when any of the shared sources changed:
+            ext.depends = ext.depends + list(keys)
+
+
+def extension_variant(ext, suffix, define_macros=()):
+    """Copy of `ext` compiled into a module with name suffixed by `suffix`."""
+    variant = deepcopy(ext)
+    variant.name = ext.name + suffix
+    variant.define_macros = [
+        m for m in variant.define_macros if m[0] != "SCS_PY_MODULE"
+    ]
+    variant.define_macros += [("SCS_PY_MODULE", variant.name)]
+    variant.define_macros += list(define_macros)
+    return variant
+
+
+def find_sources(root):
+    """Map each directory under `root` (in posix form) to its C sources."""
+    sources = defaultdict(list)
+    for dirpath, _, filenames in os.walk(root):
+        key = dirpath.replace(os.sep, "/")
+        sources[key] = sorted(
+            os.path.join(dirpath, f) for f in filenames if f.endswith(".c")
+        )
+    return sources
 
 
 def install_scs(**kwargs):
-    extra_compile_args = ["-O3"]
+    extra_compile_args = []
     extra_link_args = []
     libraries = []
+    # Walk the source tree once instead of globbing it for every extension:
+    srcs = find_sources("scs_source")
+    headers = [
+        entry.path for entry in os.scandir("scs") if entry.name.endswith(".h")
+    ]
     sources = (
-        ["scs/scspy.c"]
-        + glob("scs_source/src/*.c")
-        + glob("scs_source/linsys/*.c")
+        ["scs/scspy.c"] + srcs["scs_source/src"] + srcs["scs_source/linsys"]
     )
     include_dirs = ["scs_source/include", "scs_source/linsys"]
     define_macros = [("PYTHON", None), ("CTRLC", 1)]
-    if args.openmp:
-        extra_compile_args += ["-fopenmp"]
-        extra_link_args += ["-fopenmp"]
-        # define_macros += [("_OPENMP", None)]  # TODO: do we need this?
 
     if system() == "Linux":
         libraries += ["rt"]
@@ -222,24 +873,27 @@ def install_scs(**kwargs):
         define_macros += [("SFLOAT", 1)]  # single precision floating point
     if args.extraverbose:
         define_macros += [("VERBOSITY", 999)]  # for debugging
+    else:
+        define_macros += [("NDEBUG", None)]  # no asserts in release builds
     if args.blas64:
         define_macros += [("BLAS64", 1)]  # 64 bit blas
-    if not args.int32 and not args.gpu:
+    # GPU code must always use 32 bit ints, as for --gpu this includes cuDSS
+    if not args.int32 and not args.gpu and not args.cudss:
         define_macros += [("DLONG", 1)]  # longs for integer type
 
     _scs_direct = Extension(
         name="_scs_direct",
         sources=sources
-        + glob("scs_source/linsys/cpu/direct/*.c")
-        + glob("scs_source/linsys/external/amd/*.c")
-        + glob("scs_source/linsys/external/qdldl/*.c"),
-        depends=glob("scs/*.h"),
+        + srcs["scs_source/linsys/cpu/direct"]
+        + srcs["scs_source/linsys/external/amd"]
+        + srcs["scs_source/linsys/external/qdldl"],
+        depends=headers,
         define_macros=list(define_macros),
         include_dirs=include_dirs
         + [
             "scs_source/linsys/cpu/direct/",
             "scs_source/linsys/external/amd",
-            "scs_source/linsys/external/dqlql",
+            "scs_source/linsys/external/qdldl",
         ],
         libraries=list(libraries),
         extra_compile_args=list(extra_compile_args),
@@ -248,8 +902,8 @@ def install_scs(**kwargs):
 
     _scs_indirect = Extension(
         name="_scs_indirect",
-        sources=sources + glob("scs_source/linsys/cpu/indirect/*.c"),
-        depends=glob("scs/*.h"),
+        sources=sources + srcs["scs_source/linsys/cpu/indirect"],
+        depends=headers,
         define_macros=list(define_macros)
         + [("PY_INDIRECT", None), ("INDIRECT", 1)],
         include_dirs=include_dirs + ["scs_source/linsys/cpu/indirect/"],
@@ -260,28 +914,54 @@ def install_scs(**kwargs):
 
     ext_modules = [_scs_direct, _scs_indirect]
 
+    if not args.float32:
+        # Single precision solvers next to the double precision ones, picked
+        # with the float32 setting. The modules are loaded with their own
+        # symbol namespaces so the solver symbols need no prefix.
+        ext_modules += [
+            extension_variant(ext, "_f32", [("SFLOAT", 1)])
+            for ext in ext_modules
+        ]
+
+    if args.isa_variants:
+        if machine().lower() not in ("x86_64", "amd64"):
+            raise ValueError(
+                "--isa-variants is only supported on x86-64 machines."
+            )
+        if args.march == "native":
+            # the fallback module would not be portable either
+            raise ValueError(
+                "--isa-variants cannot be combined with --march native."
+            )
+        ext_modules += [
+            extension_variant(ext, suffix)
+            for suffix in ISA_VARIANTS
+            for ext in ext_modules
+        ]
+
     if args.gpu:
-        library_dirs = []
-        if system() == "Windows":
-            include_dirs += [os.environ["CUDA_PATH"] + "/include"]
-            library_dirs = [os.environ["CUDA_PATH"] + "/lib/x64"]
-        else:
-            include_dirs += ["/usr/local/cuda/include"]
-            library_dirs = ["/usr/local/cuda/lib", "/usr/local/cuda/lib64"]
+        cuda_include_dirs, cuda_library_dirs = cuda_paths()
         if args.gpu_atrans:  # Should be True by default
             define_macros += [("GPU_TRANSPOSE_MAT", 1)]
+        if args.cuda_static:
+            if system() == "Windows":
+                raise ValueError("--cuda-static is only supported on Linux.")
+            gpu_libraries = CUDA_STATIC_LIBS
+        else:
+            gpu_libraries = ["cudart", "cublas", "cusparse"]
         _scs_gpu = Extension(
             name="_scs_gpu",
             sources=sources
-            + glob("scs_source/linsys/gpu/*.c")
-            + glob("scs_source/linsys/gpu/indirect/*.c"),
-            depends=glob("scs/*.h"),
+            + srcs["scs_source/linsys/gpu"]
+            + srcs["scs_source/linsys/gpu/indirect"],
+            depends=headers,
             define_macros=list(define_macros)
             + [("PY_GPU", None), ("INDIRECT", 1)],
             include_dirs=include_dirs
+            + cuda_include_dirs
             + ["scs_source/linsys/gpu/", "scs_source/linsys/gpu/indirect"],
-            library_dirs=library_dirs,
-            libraries=libraries + ["cudart", "cublas", "cusparse"],
+            library_dirs=cuda_library_dirs,
+            libraries=libraries + gpu_libraries,
             extra_compile_args=list(extra_compile_args),
             extra_link_args=list(extra_link_args),
         )
@@ -304,8 +984,8 @@ def install_scs(**kwargs):
         # MKL should be included in the libraries already:
         _scs_mkl = Extension(
             name="_scs_mkl",
-            sources=sources + glob("scs_source/linsys/mkl/direct/*.c"),
-            depends=glob("scs/*.h"),
+            sources=sources + srcs["scs_source/linsys/mkl/direct"],
+            depends=headers,
             define_macros=list(define_macros) + [("PY_MKL", None)],
             include_dirs=include_dirs + ["scs_source/linsys/mkl/direct/"],
             libraries=list(libraries),
@@ -315,14 +995,20 @@ def install_scs(**kwargs):
         ext_modules += [_scs_mkl]
 
     if args.cudss:
-        # MKL should be included in the libraries already:
+        cuda_include_dirs, cuda_library_dirs = cuda_paths()
+        cudss_info = find_cudss(cuda_include_dirs)
         _scs_cudss = Extension(
             name="_scs_cudss",
-            sources=sources + glob("scs_source/linsys/cudss/direct/*.c"),
-            depends=glob("scs/*.h"),
+            sources=sources + srcs["scs_source/linsys/cudss/direct"],
+            depends=headers,
             define_macros=list(define_macros) + [("PY_CUDSS", None)],
-            include_dirs=include_dirs + ["scs_source/linsys/cudss/direct/"],
-            libraries=list(libraries),
+            include_dirs=include_dirs
+            + cuda_include_dirs
+            + cudss_info.get("include_dirs", [])
+            + ["scs_source/linsys/cudss/direct/"],
+            library_dirs=cuda_library_dirs
+            + cudss_info.get("library_dirs", []),
+            libraries=libraries + cudss_info["libraries"] + ["cudart"],
             extra_compile_args=list(extra_compile_args),
             extra_link_args=list(extra_link_args),
         )
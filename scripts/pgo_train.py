@@ -0,0 +1,103 @@
+"""Training workload for profile guided builds of SCS.
+
+Usage, from the repository root:
+
+    python legacy_setup.py build_ext --inplace --scs --pgo generate
+    python scripts/pgo_train.py
+    python legacy_setup.py build_ext --inplace --force --scs --pgo use
+
+legacy_setup.py builds the modules in place as top-level _scs_* files, so
+this script copies them into an scs package in build/pgo_train to run them.
+They write their profiles to SCS_PGO_DIR (default build/pgo) when the
+interpreter exits. With clang the raw profiles must be merged first:
+llvm-profdata merge -o build/pgo/default.profdata build/pgo.
+"""
+
+import glob
+import os
+import shutil
+import sys
+import sysconfig
+from itertools import product
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "test"))
+
+import gen_random_cone_prob as tools  # noqa: E402
+
+
+def import_scs():
+    """Import scs from the modules built in place in the repository root."""
+    modules = glob.glob(
+        os.path.join(ROOT, "_scs_*" + sysconfig.get_config_var("EXT_SUFFIX"))
+    )
+    if not modules:
+        sys.exit(
+            "No SCS modules in the repository root, build them first with "
+            "python legacy_setup.py build_ext --inplace --scs --pgo generate"
+        )
+    package_dir = os.path.join(ROOT, "build", "pgo_train")
+    shutil.rmtree(package_dir, ignore_errors=True)
+    os.makedirs(os.path.join(package_dir, "scs"))
+    shutil.copy(
+        os.path.join(ROOT, "scs", "py", "__init__.py"),
+        os.path.join(package_dir, "scs"),
+    )
+    for module in modules:
+        shutil.copy(module, os.path.join(package_dir, "scs"))
+    sys.path.insert(0, package_dir)
+    import scs
+
+    return scs
+
+
+# One problem per cone type, plus a mixed one, so every projection and both
+# linear system solvers are exercised, in both precisions.
+CONES = [
+    {"z": 50, "l": 500},
+    {"l": 100, "q": [20, 50, 100, 3]},
+    {"l": 50, "s": [10, 20, 3]},
+    {"l": 50, "ep": 100, "ed": 100},
+    {"l": 50, "p": [-0.25, 0.5, 0.75, -0.33] * 25},
+    {
+        "z": 10,
+        "l": 100,
+        "q": [5, 10, 50],
+        "s": [3, 10],
+        "ep": 20,
+        "ed": 20,
+        "p": [-0.25, 0.5, 0.75, -0.33],
+    },
+]
+EMPTY_CONE = {"z": 0, "l": 0, "q": [], "s": [], "ep": 0, "ed": 0, "p": []}
+
+
+def main():
+    scs = import_scs()
+    np.random.seed(0)
+    for use_indirect, float32 in product((False, True), repeat=2):
+        for cone in CONES:
+            K = dict(EMPTY_CONE, **cone)
+            m = tools.get_scs_cone_dims(K)
+            data, _ = tools.gen_feasible(K, n=m // 3, density=0.05)
+            sol = scs.solve(
+                data,
+                K,
+                use_indirect=use_indirect,
+                float32=float32,
+                verbose=False,
+                max_iters=2000,
+            )
+            print(
+                "indirect" if use_indirect else "direct",
+                "float32" if float32 else "float64",
+                sorted(cone),
+                sol["info"]["status"],
+                sol["info"]["iter"],
+            )
+
+
+if __name__ == "__main__":
+    main()
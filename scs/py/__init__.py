@@ -1,4 +1,6 @@
 #!/usr/bin/env python
+from functools import lru_cache
+from importlib import import_module
 from warnings import warn
 from scipy import sparse
 from scs import _scs_direct
@@ -9,6 +11,10 @@ __sizeof_float__ = _scs_direct.sizeof_float()
 
 _USE_INDIRECT_DEFAULT = False
 
+# Instruction set specific builds of the CPU solvers (see `--isa-variants` in
+# legacy_setup.py), keyed by the x86-64 micro-architecture level they need.
+_ISA_VARIANTS = ((4, "_x86_64_v4"), (3, "_x86_64_v3"))
+
 
 # SCS return integers correspond to one of these flags:
 # (copied from scs/include/glbopts.h)
@@ -24,9 +30,43 @@ SOLVED = 1  # problem solved to desired accuracy
 SOLVED_INACCURATE = 2  # SCS best guess solved
 
 
+# Import the fastest available build of an SCS module for this CPU.
+@lru_cache(maxsize=None)
+def _import_fastest(name):
+    level = _scs_direct.isa_level()
+    for required_level, suffix in _ISA_VARIANTS:
+        if level >= required_level:
+            try:
+                return import_module("scs." + name + suffix)
+            except ImportError:
+                pass
+    return import_module("scs." + name)
+
+
+# Import the single precision build of an SCS module (`float32=True`).
+def _import_float32(name):
+    if __sizeof_float__ == 4:  # built with `--float`
+        return _import_fastest(name)
+    try:
+        return _import_fastest(name + "_f32")
+    except ImportError:
+        raise NotImplementedError(
+            "This SCS was built without 32 bit solvers, pass `float32=False`."
+        )
+
+
 # Choose which SCS to import based on settings.
 def _select_scs_module(stgs):
 
+    if stgs.pop("float32", False):  # False by default
+        if any([stgs.pop(k, False) for k in ("gpu", "mkl", "cudss")]):
+            raise NotImplementedError(
+                "32 bit floats are only available for the CPU solvers."
+            )
+        if stgs.pop("use_indirect", _USE_INDIRECT_DEFAULT):
+            return _import_float32("_scs_indirect")
+        return _import_float32("_scs_direct")
+
     if stgs.pop("gpu", False):  # False by default
         if not stgs.pop("use_indirect", _USE_INDIRECT_DEFAULT):
             raise NotImplementedError(
@@ -54,11 +94,9 @@ def _select_scs_module(stgs):
         return _scs_cudss
 
     if stgs.pop("use_indirect", _USE_INDIRECT_DEFAULT):
-        from scs import _scs_indirect
-
-        return _scs_indirect
+        return _import_fastest("_scs_indirect")
 
-    return _scs_direct
+    return _import_fastest("_scs_direct")
 
 
 class SCS(object):
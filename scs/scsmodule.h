@@ -1,6 +1,28 @@
 #ifndef PY_SCSMODULE_H
 #define PY_SCSMODULE_H
 
+/* Name of the extension module. This can be overridden to build several
+ * variants of the same solver side by side, e.g. for different instruction
+ * sets. */
+#ifndef SCS_PY_MODULE
+#ifdef PY_INDIRECT
+#define SCS_PY_MODULE _scs_indirect
+#elif defined PY_GPU
+#define SCS_PY_MODULE _scs_gpu
+#elif defined PY_MKL
+#define SCS_PY_MODULE _scs_mkl
+#elif defined PY_CUDSS
+#define SCS_PY_MODULE _scs_cudss
+#else
+#define SCS_PY_MODULE _scs_direct
+#endif
+#endif
+
+#define SCS_PY_CAT_(a, b) a##b
+#define SCS_PY_CAT(a, b) SCS_PY_CAT_(a, b)
+#define SCS_PY_STR_(a) #a
+#define SCS_PY_STR(a) SCS_PY_STR_(a)
+
 static PyObject *version(PyObject *self) {
   return Py_BuildValue("s", scs_version());
 }
@@ -13,12 +35,85 @@ static PyObject *sizeof_float(PyObject *self) {
   return Py_BuildValue("n", sizeof(scs_float));
 }
 
+/* Highest x86-64 micro-architecture level (1-4) supported by the running
+ * CPU, used to pick between the instruction set specific builds. Returns 0
+ * if this cannot be determined (other architectures or compilers). */
+#if defined(__GNUC__) && (defined(__x86_64__) || defined(__i386__))
+#if (defined(__clang__) && __clang_major__ >= 16) ||                         \
+    (!defined(__clang__) && __GNUC__ >= 12)
+static long scs_isa_level(void) {
+  __builtin_cpu_init();
+  if (__builtin_cpu_supports("x86-64-v4")) {
+    return 4;
+  }
+  if (__builtin_cpu_supports("x86-64-v3")) {
+    return 3;
+  }
+  if (__builtin_cpu_supports("x86-64-v2")) {
+    return 2;
+  }
+  return 1;
+}
+#else
+#include <cpuid.h>
+
+#define SCS_HAS_BITS(reg, bits) (((reg) & (bits)) == (bits))
+
+/* Older compilers only know some of the features of each level, so check
+ * all of them with cpuid, and with xgetbv that the OS saves the AVX state. */
+static long scs_isa_level(void) {
+  unsigned int eax, ebx, ecx, edx, ecx1, ecx_ext, ebx7 = 0, xcr0 = 0;
+  if (!__get_cpuid(1, &eax, &ebx, &ecx1, &edx) ||
+      !__get_cpuid(0x80000001, &eax, &ebx, &ecx_ext, &edx)) {
+    return 1;
+  }
+  if (__get_cpuid_max(0, NULL) >= 7) {
+    __cpuid_count(7, 0, eax, ebx7, ecx, edx);
+  }
+  /* sse3, ssse3, cx16, sse4.1, sse4.2, popcnt and lahf_lm */
+  if (!SCS_HAS_BITS(ecx1, (1u << 0) | (1u << 9) | (1u << 13) | (1u << 19) |
+                              (1u << 20) | (1u << 23)) ||
+      !SCS_HAS_BITS(ecx_ext, 1u << 0)) {
+    return 1;
+  }
+  if (SCS_HAS_BITS(ecx1, 1u << 27)) { /* osxsave */
+    __asm__("xgetbv" : "=a"(xcr0), "=d"(edx) : "c"(0));
+  }
+  /* fma, movbe, xsave, avx and f16c, lzcnt, bmi1, avx2 and bmi2, and the
+   * xmm / ymm state */
+  if (!SCS_HAS_BITS(ecx1, (1u << 12) | (1u << 22) | (1u << 26) |
+                              (1u << 28) | (1u << 29)) ||
+      !SCS_HAS_BITS(ecx_ext, 1u << 5) ||
+      !SCS_HAS_BITS(ebx7, (1u << 3) | (1u << 5) | (1u << 8)) ||
+      !SCS_HAS_BITS(xcr0, 0x6)) {
+    return 2;
+  }
+  /* avx512f, avx512dq, avx512cd, avx512bw and avx512vl, and the opmask /
+   * zmm state */
+  if (!SCS_HAS_BITS(ebx7, (1u << 16) | (1u << 17) | (1u << 28) |
+                              (1u << 30) | (1u << 31)) ||
+      !SCS_HAS_BITS(xcr0, 0xe6)) {
+    return 3;
+  }
+  return 4;
+}
+#endif
+#else
+static long scs_isa_level(void) { return 0; }
+#endif
+
+static PyObject *isa_level(PyObject *self) {
+  return Py_BuildValue("l", scs_isa_level());
+}
+
 static PyMethodDef scs_module_methods[] = {
     {"version", (PyCFunction)version, METH_NOARGS, "Version number for SCS."},
     {"sizeof_int", (PyCFunction)sizeof_int, METH_NOARGS,
      "Int size (in bytes) SCS uses."},
     {"sizeof_float", (PyCFunction)sizeof_float, METH_NOARGS,
      "Float size (in bytes) SCS uses."},
+    {"isa_level", (PyCFunction)isa_level, METH_NOARGS,
+     "x86-64 micro-architecture level supported by the CPU."},
     {NULL, NULL} /* sentinel */
 };
 
@@ -43,17 +138,7 @@ static PyObject *moduleinit(void) {
 #if PY_MAJOR_VERSION >= 3
   m = PyModule_Create(&moduledef);
 #else
-#ifdef PY_INDIRECT
-  m = Py_InitModule("_scs_indirect", scs_module_methods);
-#elif defined PY_GPU
-  m = Py_InitModule("_scs_gpu", scs_module_methods);
-#elif defined PY_MKL
-  m = Py_InitModule("_scs_mkl", scs_module_methods);
-#elif defined PY_CUDSS
-  m = Py_InitModule("_scs_cudss", scs_module_methods);
-#else
-  m = Py_InitModule("_scs_direct", scs_module_methods);
-#endif
+  m = Py_InitModule(SCS_PY_STR(SCS_PY_MODULE), scs_module_methods);
 #endif
 
   if (m == NULL) {
@@ -75,34 +160,14 @@ static PyObject *moduleinit(void) {
 
 #if PY_MAJOR_VERSION >= 3
 PyMODINIT_FUNC
-#ifdef PY_INDIRECT
-PyInit__scs_indirect(void)
-#elif defined PY_GPU
-PyInit__scs_gpu(void)
-#elif defined PY_MKL
-PyInit__scs_mkl(void)
-#elif defined PY_CUDSS
-PyInit__scs_cudss(void)
-#else
-PyInit__scs_direct(void)
-#endif
+SCS_PY_CAT(PyInit_, SCS_PY_MODULE)(void)
 {
   import_array(); /* for numpy arrays */
   return moduleinit();
 }
 #else
 PyMODINIT_FUNC
-#ifdef PY_INDIRECT
-init_scs_indirect(void)
-#elif defined PY_GPU
-init_scs_gpu(void)
-#elif defined PY_MKL
-init_scs_mkl(void)
-#elif defined PY_CUDSS
-init_scs_cudss(void)
-#else
-init_scs_direct(void)
-#endif
+SCS_PY_CAT(init, SCS_PY_MODULE)(void)
 {
   import_array(); /* for numpy arrays */
   moduleinit();
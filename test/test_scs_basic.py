@@ -57,6 +57,23 @@ def test_problems(cone, use_indirect, expected):
     assert_almost_equal(sol["x"][0], expected, decimal=2)
 
 
+@pytest.mark.parametrize("use_indirect", [False, True])
+def test_float32(use_indirect):
+    try:
+        solver = scs.SCS(
+            data,
+            cone={"q": [], "l": 2},
+            use_indirect=use_indirect,
+            float32=True,
+            verbose=False,
+        )
+    except NotImplementedError:
+        pytest.skip("SCS built without 32 bit solvers")
+    sol = solver.solve()
+    assert sol["x"].dtype == np.float32
+    assert_almost_equal(sol["x"][0], 1, decimal=2)
+
+
 if platform.python_version_tuple() < ("3", "0", "0"):
 
     @pytest.mark.parametrize(